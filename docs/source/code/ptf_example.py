@@ -30,4 +30,12 @@ compare_ptf([ptf_a, ptf_b, ptf_c],
 
 # plot some variables from one file
 ptf_a.plot(["RN2-DFBBT-10-cls_7", "RN2-DFBBT-10-cls_8"],
-           output_path="out/RN2_cl78.png")
\ No newline at end of file
+           output_path="out/RN2_cl78.png")
+# extract variables once and plot them one by one without re-reading file
+ptf_a.preload(["RN2-DFBBT-10-cls_7", "RN2-DFBBT-10-cls_8"])
+for var in ["RN2-DFBBT-10-cls_7", "RN2-DFBBT-10-cls_8"]:
+    ptf_a.plot([var], output_path=f"out/{var}.png")
+
+# zero-copy access to single variables of all the records
+records = ptf_a.to_records()
+temperature = records["RN2-DFBBT-10-cls_7"]
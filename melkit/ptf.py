@@ -3,16 +3,216 @@ Module for handling PTF files
 '''
 
 
+import mmap
 import numpy as np
 import os
+import threading
 import typing
-from struct import unpack
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from struct import unpack_from
 from pathlib import Path
 
 import pandas as pd
 
+from .exceptions import ParseException
 
-def MCRBin(ptf_path: typing.Union[str, os.PathLike], vars_to_search: list):
+
+# size of single read() when loading the whole PTF file
+_READ_CHUNK_BYTES = 16 * 1024 * 1024
+# number of extracted DataFrames cached by each Ptf
+_DF_CACHE_SIZE = 32
+
+
+def _read_file(ptf_path: typing.Union[str, os.PathLike]) -> bytearray:
+    """ Read whole PTF file in large chunks into preallocated buffer """
+    with open(ptf_path, 'rb', buffering=0) as ptf:
+        size = os.fstat(ptf.fileno()).st_size
+        if hasattr(os, 'posix_fadvise'):
+            # let the kernel read ahead aggressively
+            try:
+                os.posix_fadvise(ptf.fileno(), 0, size,
+                                 os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        buf = bytearray(size)
+        view = memoryview(buf)
+        n_read = 0
+        while n_read < size:
+            chunk = ptf.readinto(view[n_read:n_read + _READ_CHUNK_BYTES])
+            if not chunk:
+                break
+            n_read += chunk
+        view.release()
+    del buf[n_read:]
+    return buf
+
+
+def _map_file(ptf_path: typing.Union[str, os.PathLike]):
+    """ Memory map PTF file read-only, read it whole if mmap fails """
+    try:
+        with open(ptf_path, 'rb') as ptf:
+            return mmap.mmap(ptf.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # mmap is not available everywhere (e.g. some network file
+        # systems) and empty files cannot be mapped
+        return _read_file(ptf_path)
+
+
+def _decode_strings(buf: bytes, offset: int, count: int,
+                    width: int) -> list:
+    """ Decode `count` fixed `width` strings stored in `buf` at `offset` """
+    raw = np.frombuffer(buf, dtype=f'S{width}', count=count, offset=offset)
+    return np.char.strip(np.char.decode(raw, 'utf-8')).tolist()
+
+
+def _read_header(ptf_path: typing.Union[str, os.PathLike],
+                 buf: typing.Optional[bytes] = None) -> dict:
+    """
+    Parse the header of MELCOR PTF file and locate its data records
+    Taken from https://github.com/mattdon/MELCOR_pyPlot, commit 35a2503,
+    modified
+
+    Returns dict with the PTF title, list of available variables, their
+    units, file offsets of the `.TR/` data records, record length in bytes
+    and number of records. File content `buf` is mapped from `ptf_path` if
+    not given.
+    """
+    # only the last few block tags are ever looked back at
+    last_tags = [None] * 8
+    DataPos = []
+    record_stride_bytes = 0
+    cntr = 0
+    probemTitle = None
+    VarName = VarNam = VarPos = VarUdm = VarNum = None
+    if buf is None:
+        # walk the blocks over file mapping, so that the data records are
+        # not loaded into memory
+        buf = _map_file(ptf_path)
+    off = 0
+    while off + 4 <= len(buf):
+        blk_len = int.from_bytes(buf[off:off+4], 'little')
+        if off + blk_len + 8 > len(buf):
+            # incomplete last block, e.g. MELCOR is still writing the file
+            break
+        off += 4
+        tag = None
+        if blk_len == 4:
+            tag = str(buf[off:off+4], 'utf-8')
+        elif last_tags[(cntr - 1) % 8] == 'TITL':
+            probemTitle = str(buf[off:off+blk_len], 'utf-8')
+        elif last_tags[(cntr - 1) % 8] == 'KEY ':
+            VarName = unpack_from('<2I', buf, off)
+        elif last_tags[(cntr - 2) % 8] == 'KEY ':
+            VarNam = _decode_strings(buf, off, VarName[0],
+                                     blk_len // VarName[0])
+        elif last_tags[(cntr - 3) % 8] == 'KEY ':
+            VarPos = np.frombuffer(
+                buf, dtype='<u4', count=VarName[0], offset=off)
+        elif last_tags[(cntr - 4) % 8] == 'KEY ':
+            VarUdm = _decode_strings(buf, off, VarName[0], 16)
+        elif last_tags[(cntr - 5) % 8] == 'KEY ':
+            VarNum = np.frombuffer(
+                buf, dtype='<u4', count=VarName[1], offset=off)
+        elif last_tags[(cntr - 1) % 8] == '.TR/':
+            if not DataPos:
+                record_stride_bytes = blk_len
+            DataPos.append(off)
+        last_tags[cntr % 8] = tag
+        # skip block payload and trailing block length
+        off += blk_len + 4
+        cntr += 1
+
+    if probemTitle is None:
+        raise ParseException(ptf_path, "PTF header incomplete: no TITL block")
+    if any(block is None for block in (VarName, VarNam, VarPos, VarUdm,
+                                       VarNum)):
+        raise ParseException(
+            ptf_path, "PTF header incomplete: KEY blocks are missing")
+    itm_x_Var = np.diff(np.append(VarPos, VarName[1]+1))
+    if len(itm_x_Var) != len(VarNam):
+        raise ParseException(
+            ptf_path, f"PTF header inconsistent: {len(itm_x_Var)} offsets "
+            f"for {len(VarNam)} variables")
+    if (itm_x_Var < 0).any():
+        raise ParseException(
+            ptf_path, "PTF header inconsistent: variable offsets "
+            f"{VarPos.tolist()} do not fit {VarName[1]} items")
+    if itm_x_Var.sum() != len(VarNum):
+        raise ParseException(
+            ptf_path, f"PTF header inconsistent: {itm_x_Var.sum()} items "
+            f"of variables vs {len(VarNum)} items in VarNum")
+    # one column per item, named VAR for item 0 and VAR_item else
+    names = np.repeat(np.asarray(VarNam, dtype=str), itm_x_Var)
+    suffixes = np.where(VarNum == 0, '',
+                        np.char.add('_', VarNum.astype(str)))
+    available_vars = ['TIME', 'CPU', 'DT', 'UNKN03'] + \
+        np.char.add(names, suffixes).tolist()
+    VarUdmFull = ['sec', '', '', ''] + \
+        np.repeat(np.asarray(VarUdm, dtype=str), itm_x_Var).tolist()
+    # first occurrence wins, same as available_vars.index()
+    col_index = {}
+    for i, Var in enumerate(available_vars):
+        col_index.setdefault(Var, i)
+
+    return {
+        'title': probemTitle,
+        'available_vars': available_vars,
+        'col_index': col_index,
+        'var_udm_full': VarUdmFull,
+        'data_pos': np.asarray(DataPos, dtype=np.int64),
+        'record_stride_bytes': record_stride_bytes,
+        'record_count': len(DataPos),
+    }
+
+
+def _gather_records(ptf_path: typing.Union[str, os.PathLike],
+                    data_pos: np.ndarray, col_idx: np.ndarray,
+                    buf: typing.Optional[bytes] = None) -> np.ndarray:
+    """
+    Gather float32 cells `col_idx` of every `.TR/` record starting at
+    `data_pos` (byte offsets) into (records, columns) array. Already read
+    file content `buf` is used if given, otherwise the file is memory mapped
+    and only the pages holding the desired cells are read.
+    """
+    # `.TR/` records are contiguous float32 arrays, gather all the desired
+    # cells at once
+    align = int(data_pos[0]) % 4
+    if buf is None:
+        buf = _map_file(ptf_path)
+        if isinstance(buf, mmap.mmap):
+            # only the pages holding the desired cells are touched, so when
+            # they are sparse readahead of whole records is wasted
+            record_len = int(data_pos[1] - data_pos[0]) \
+                if len(data_pos) > 1 else 0
+            if hasattr(mmap, 'MADV_RANDOM') and \
+                    len(col_idx) * mmap.PAGESIZE < record_len:
+                buf.madvise(mmap.MADV_RANDOM)
+    values = np.frombuffer(buf, dtype='<f4',
+                           count=(len(buf) - align) // 4, offset=align)
+    starts = (data_pos - align) // 4
+    if int(starts[-1]) + int(col_idx.max()) >= len(values):
+        raise ParseException(
+            ptf_path, "`.TR/` records reach past the end of PTF file")
+    spacing = np.diff(starts)
+    if len(spacing) and (spacing != spacing[0]).any():
+        # records are not evenly spaced, gather through index array and
+        # transpose, so that the result is in Fortran order
+        return np.asarray(values[col_idx[:, None] + starts[None, :]]).T
+    # view the records as (records, record width) array and copy the
+    # desired columns one by one, no index array is built
+    step = int(spacing[0]) if len(spacing) else 0
+    records = np.lib.stride_tricks.as_strided(
+        values[starts[0]:], shape=(len(starts), int(col_idx.max()) + 1),
+        strides=(step * values.itemsize, values.itemsize), writeable=False)
+    data = np.empty((len(starts), len(col_idx)), dtype=np.float32, order='F')
+    for i, col in enumerate(col_idx):
+        data[:, i] = records[:, col]
+    return data
+
+
+def MCRBin(ptf_path: typing.Union[str, os.PathLike], vars_to_search: list,
+           header: typing.Optional[dict] = None):
     """
     Read column names and values from MELCOR PTF file
     Taken from https://github.com/mattdon/MELCOR_pyPlot, commit 35a2503,
@@ -24,226 +224,62 @@ def MCRBin(ptf_path: typing.Union[str, os.PathLike], vars_to_search: list):
     @ In, fileDirectory, string, the file directory. This is the directory
     of the MELCOR plot file
     @ In, variableSearch, list, list of variables to be collected
+    @ In, header, dict, optional, already parsed PTF header (see
+    `Ptf._parse_header`), the header is read from file if not given
     @ Out, Data, tuple (numpy.ndarray,numpy.ndarray,numpy.ndarray),
     this contains the extracted data for each declare variable
     """
-    HdrList = []
-    BlkLenBef = []
-    BlkLenAft = []
-    DataPos = []
-    cntr = 0
-    Var_dict = {}
-    with open(ptf_path, 'rb') as ptf:
-        while True:
-            BlkLenBefSlave = ptf.read(4)
-            if not BlkLenBefSlave:
-                break
-            BlkLenBef.append(unpack('I', BlkLenBefSlave)[0])
-            if BlkLenBef[cntr] == 4:
-                HdrList.append(str(unpack('4s', ptf.read(4))[0], 'utf-8'))
-            elif HdrList[cntr - 1] == 'TITL':
-                probemTitle = str(
-                    unpack('%d' % BlkLenBef[cntr] + 's',
-                           ptf.read(BlkLenBef[cntr]))[0], 'utf-8')
-                HdrList.append([])
-            elif HdrList[cntr - 1] == 'KEY ':
-                VarName = unpack('2I', ptf.read(8))
-                HdrList.append([])
-            elif HdrList[cntr - 2] == 'KEY ':
-                a = BlkLenBef[-1]/VarName[0]
-                stringa = str(int(a))+"s"
-                VarNam = [str(i, 'utf-8') for i in unpack(
-                    stringa * VarName[0], ptf.read(BlkLenBef[cntr]))]
-                HdrList.append([])
-            elif HdrList[cntr - 3] == 'KEY ':
-                VarPos = unpack(
-                    '%d' % VarName[0] + 'I', ptf.read(BlkLenBef[cntr]))
-                HdrList.append([])
-            elif HdrList[cntr - 4] == 'KEY ':
-                VarUdm = [str(i, 'utf-8') for i in unpack(
-                    '16s' * VarName[0], ptf.read(BlkLenBef[cntr]))]
-                HdrList.append([])
-            elif HdrList[cntr - 5] == 'KEY ':
-                VarNum = unpack(
-                    '%d' % VarName[1] + 'I', ptf.read(BlkLenBef[cntr]))
-                available_vars = []
-                VarUdmFull = []
-                NamCntr = 0
-                VarPos = VarPos + (VarName[1]+1,)
-                VarSrchPos = [0]
-                itm_x_Var = []
-                for k in range(0, len(VarNam)):
-                    itm_x_Var.append(VarPos[k+1]-VarPos[k])
-                if len(itm_x_Var) != len(VarNam):
-                    print("Number of variables different from number "
-                          "of items of offset array")
-                    print(itm_x_Var)
-                    print(len(VarNam))
-                    break
-                Items_Tot = sum(itm_x_Var)
-                if Items_Tot != len(VarNum):
-                    print("Sum of items to be associated with each variable "
-                          "is different from the sum of all items id VarNum")
-                VarNum_Cntr = 0
-                Var_dict = {}
-                for i, Var in enumerate(VarNam):
-                    NumOfItems = itm_x_Var[i]
-                    end = VarNum_Cntr + NumOfItems
-                    Var_dict[Var] = list(VarNum[VarNum_Cntr:end])
-                    VarNum_Cntr = VarNum_Cntr+NumOfItems
-                for key in Var_dict.keys():
-                    for element in Var_dict[key]:
-                        if element == 0:
-                            available_vars.append(str(key).strip())
-                        else:
-                            available_vars.append(key.strip()+'_%d' % element)
-                for i, item in enumerate(itm_x_Var):
-                    for k in range(0, item):
-                        VarUdmFull.append(VarUdm[i].strip())
-                available_vars = ['TIME', 'CPU',
-                                  'DT', 'UNKN03'] + available_vars
-                VarUdmFull = ['sec', '', '', ''] + VarUdmFull
-
-                for var in vars_to_search:
-                    VarSrchPos.append(available_vars.index(var.strip()))
-                VarUdmFull = [VarUdmFull[i] for i in VarSrchPos]
-                SwapPosVarSrch = sorted(range(len(VarSrchPos)),
-                                        key=lambda k: VarSrchPos[k])
-                SwapPosVarSrch = sorted(range(len(SwapPosVarSrch)),
-                                        key=lambda k: SwapPosVarSrch[k])
-                VarSrchPos.sort()
-                VarSrchPos.append(VarName[1]+4)
-                HdrList.append([])
-            elif HdrList[cntr - 1] == '.TR/':
-                DataPos.append(ptf.tell())
-                ptf.seek(BlkLenBef[cntr], 1)
-                HdrList.append([])
-            else:
-                HdrList.append([])
-            BlkLenAft.append(unpack('I', ptf.read(4))[0])
-
-            cntr += 1
-
-    data = np.empty([len(DataPos), len(vars_to_search)+1])*np.nan
-    with open(ptf_path, 'rb') as ptf:
-        for i, Pos in enumerate(DataPos):
-            ptf.seek(Pos, 0)
-            for j in range(len(VarSrchPos)-1):
-                data[i, j] = unpack('f', ptf.read(4))[0]
-                ptf.seek((VarSrchPos[j+1]-VarSrchPos[j])*4-4, 1)
-    data = data[:, SwapPosVarSrch]
-    return data[:, 0], data[:, 1:], VarUdmFull[1:], available_vars, probemTitle
+    buf = None
+    if header is None:
+        # parse header and data from the same file mapping
+        buf = _map_file(ptf_path)
+        header = _read_header(ptf_path, buf)
+    available_vars = header['available_vars']
+    col_index = header['col_index']
+    DataPos = header['data_pos']
+
+    VarSrchPos = [0]
+    for var in vars_to_search:
+        VarSrchPos.append(col_index[var.strip()])
+    VarUdmFull = [header['var_udm_full'][i] for i in VarSrchPos]
+
+    if len(DataPos):
+        data = _gather_records(ptf_path, DataPos,
+                               np.asarray(VarSrchPos, dtype=np.int64), buf)
+    else:
+        data = np.empty([0, len(VarSrchPos)], dtype=np.float32, order='F')
+    return (data[:, 0], data[:, 1:], VarUdmFull[1:], available_vars,
+            header['title'])
 
 
 def inspect_ptf(ptf_path: typing.Union[str, os.PathLike]):
-    HdrList = []
-    BlkLenBef = []
-    BlkLenAft = []
-    DataPos = []
-    cntr = 0
-    Var_dict = {}
-    with open(ptf_path, 'rb') as ptf:
-        while True:
-            BlkLenBefSlave = ptf.read(4)
-            if not BlkLenBefSlave:
-                break
-            BlkLenBef.append(unpack('I', BlkLenBefSlave)[0])
-            if BlkLenBef[cntr] == 4:
-                HdrList.append(str(unpack('4s', ptf.read(4))[0], 'utf-8'))
-            elif HdrList[cntr - 1] == 'TITL':
-                probemTitle = str(
-                    unpack('%d' % BlkLenBef[cntr] + 's',
-                           ptf.read(BlkLenBef[cntr]))[0], 'utf-8')
-                HdrList.append([])
-            elif HdrList[cntr - 1] == 'KEY ':
-                VarName = unpack('2I', ptf.read(8))
-                HdrList.append([])
-            elif HdrList[cntr - 2] == 'KEY ':
-                a = BlkLenBef[-1]/VarName[0]
-                stringa = str(int(a))+"s"
-                VarNam = [str(i, 'utf-8') for i in unpack(
-                    stringa * VarName[0], ptf.read(BlkLenBef[cntr]))]
-                HdrList.append([])
-            elif HdrList[cntr - 3] == 'KEY ':
-                VarPos = unpack(
-                    '%d' % VarName[0] + 'I', ptf.read(BlkLenBef[cntr]))
-                HdrList.append([])
-            elif HdrList[cntr - 4] == 'KEY ':
-                VarUdm = [str(i, 'utf-8') for i in unpack(
-                    '16s' * VarName[0], ptf.read(BlkLenBef[cntr]))]
-                HdrList.append([])
-            elif HdrList[cntr - 5] == 'KEY ':
-                VarNum = unpack(
-                    '%d' % VarName[1] + 'I', ptf.read(BlkLenBef[cntr]))
-                available_vars = []
-                VarUdmFull = []
-                NamCntr = 0
-                VarPos = VarPos + (VarName[1]+1,)
-                VarSrchPos = [0]
-                itm_x_Var = []
-                for k in range(0, len(VarNam)):
-                    itm_x_Var.append(VarPos[k+1]-VarPos[k])
-                if len(itm_x_Var) != len(VarNam):
-                    print("Number of variables different from number "
-                          "of items of offset array")
-                    print(itm_x_Var)
-                    print(len(VarNam))
-                    break
-                Items_Tot = sum(itm_x_Var)
-                if Items_Tot != len(VarNum):
-                    print("Sum of items to be associated with each variable "
-                          "is different from the sum of all items id VarNum")
-                VarNum_Cntr = 0
-                Var_dict = {}
-                for i, Var in enumerate(VarNam):
-                    NumOfItems = itm_x_Var[i]
-                    end = VarNum_Cntr + NumOfItems
-                    Var_dict[Var] = list(VarNum[VarNum_Cntr:end])
-                    VarNum_Cntr = VarNum_Cntr+NumOfItems
-                for key in Var_dict.keys():
-                    for element in Var_dict[key]:
-                        if element == 0:
-                            available_vars.append(str(key).strip())
-                        else:
-                            available_vars.append(key.strip()+'_%d' % element)
-                for i, item in enumerate(itm_x_Var):
-                    for k in range(0, item):
-                        VarUdmFull.append(VarUdm[i].strip())
-                available_vars = ['TIME', 'CPU',
-                                  'DT', 'UNKN03'] + available_vars
-                VarUdmFull = ['sec', '', '', ''] + VarUdmFull
-
-                # TODO: this seems quite useless, i.e. VarSrchPos is just
-                # list(range(len(available_vars)))
-                for var in available_vars:
-                    VarSrchPos.append(available_vars.index(var.strip()))
-                VarUdmFull = [VarUdmFull[i] for i in VarSrchPos]
-                SwapPosVarSrch = sorted(range(len(VarSrchPos)),
-                                        key=lambda k: VarSrchPos[k])
-                SwapPosVarSrch = sorted(range(len(SwapPosVarSrch)),
-                                        key=lambda k: SwapPosVarSrch[k])
-                VarSrchPos.sort()
-                VarSrchPos.append(VarName[1]+4)
-                HdrList.append([])
-            elif HdrList[cntr - 1] == '.TR/':
-                DataPos.append(ptf.tell())
-                ptf.seek(BlkLenBef[cntr], 1)
-                HdrList.append([])
-            else:
-                HdrList.append([])
-            BlkLenAft.append(unpack('I', ptf.read(4))[0])
-
-            cntr += 1
-    return available_vars, probemTitle
+    """ Get list of available variables and title of PTF file """
+    header = _read_header(ptf_path)
+    return header['available_vars'], header['title']
 
 
 class Ptf:
     """ Class to extract, plot and compare data in PTF files """
     def __init__(self, path: typing.Union[str, os.PathLike]):
         self.path = path
-        variables, title = inspect_ptf(path)
-        self._title = title.strip()
-        self._columns = variables
+        self._mtime_ns = None
+        # extracted DataFrames keyed on (columns, mtime_ns), least recently
+        # used first
+        self._df_cache = OrderedDict()
+        self._df_cache_lock = threading.Lock()
+        self._parse_header()
+
+    def _parse_header(self):
+        """ Parse PTF header, reuse the cached one if file is unchanged """
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return self._header
+        header = _read_header(self.path)
+        self._header = header
+        self._title = header['title'].strip()
+        self._available_vars = header['available_vars']
+        self._mtime_ns = mtime_ns
+        return header
 
     @property
     def title(self):
@@ -253,55 +289,133 @@ class Ptf:
     @property
     def columns(self):
         """Get the list of variables in PTF file."""
-        return self._columns
+        return self._available_vars
 
     def __str__(self) -> str:
         return f"PTF file of title {self.title}"
 
     def to_DataFrame(self, columns: list):
+        """ Extract variables of PTF file into DataFrame indexed by time """
+        self._parse_header()
         desired_cols = set(columns)
         available_cols = set(self.columns)
         if not desired_cols.issubset(available_cols):
             raise KeyError(f"Desired columns {desired_cols - available_cols} "
                            f"are not available in PTF {self.title}")
-        time, data, units, _, _ = MCRBin(self.path, columns)
+        df = self._to_DataFrame_cached(tuple(sorted(desired_cols)),
+                                       self._mtime_ns)
+        # selection returns new DataFrame, the cached one is never exposed
+        return df[list(columns)]
+
+    def preload(self, variables: list):
+        """ Extract variables in advance, any later `to_DataFrame` or `plot`
+        call for a subset of them reuses the extracted data
+        """
+        self.to_DataFrame(variables)
+
+    def to_records(self) -> np.ndarray:
+        """ View `.TR/` records of PTF file as structured array with one
+        float32 field per variable, e.g. `ptf.to_records()['TIME']`. Fields
+        are strided views of the memory mapped file, no data are copied.
+        """
+        header = self._parse_header()
+        col_index = header['col_index']
+        dtype = np.dtype({
+            'names': list(col_index),
+            'formats': ['<f4'] * len(col_index),
+            'offsets': [i * 4 for i in col_index.values()],
+            'itemsize': header['record_stride_bytes'] or
+            4 * len(header['available_vars']),
+        })
+        data_pos = header['data_pos']
+        if not len(data_pos):
+            return np.empty(0, dtype=dtype)
+        spacing = np.diff(data_pos)
+        if len(spacing) and (spacing != spacing[0]).any():
+            raise ParseException(
+                self.path, "`.TR/` records are not evenly spaced, use "
+                "to_DataFrame instead")
+        step = int(spacing[0]) if len(spacing) else dtype.itemsize
+        with open(self.path, 'rb') as ptf:
+            mm = mmap.mmap(ptf.fileno(), 0, access=mmap.ACCESS_READ)
+        return np.ndarray(shape=(len(data_pos),), dtype=dtype, buffer=mm,
+                          offset=int(data_pos[0]), strides=(step,))
+
+    def clear_cache(self):
+        """ Drop DataFrames cached by `to_DataFrame` """
+        with self._df_cache_lock:
+            self._df_cache.clear()
+
+    def _to_DataFrame_cached(self, columns: tuple, mtime_ns: int):
+        """ Extract columns of PTF file, cached per columns and file mtime """
+        key = (columns, mtime_ns)
+        with self._df_cache_lock:
+            if key in self._df_cache:
+                self._df_cache.move_to_end(key)
+                return self._df_cache[key]
+            # a frame holding more columns (e.g. from `preload`) serves too
+            for cached_columns, cached_mtime_ns in reversed(self._df_cache):
+                if cached_mtime_ns == mtime_ns and \
+                        set(columns).issubset(cached_columns):
+                    self._df_cache.move_to_end(
+                        (cached_columns, cached_mtime_ns))
+                    return self._df_cache[(cached_columns, cached_mtime_ns)]
+        time, data, units, _, _ = MCRBin(self.path, list(columns),
+                                         self._header)
+        # build from contiguous columns so pandas does not copy the data
         df = pd.DataFrame(
-            index=time,
-            columns=columns,
-            data=data,
+            {column: data[:, i] for i, column in enumerate(columns)},
+            index=pd.Index(time, copy=False),
+            copy=False,
         )
+        with self._df_cache_lock:
+            # frames of an older version of the file are never hit again
+            for stale in [k for k in self._df_cache if k[1] != mtime_ns]:
+                del self._df_cache[stale]
+            self._df_cache[key] = df
+            while len(self._df_cache) > _DF_CACHE_SIZE:
+                self._df_cache.popitem(last=False)
         return df
-    
-    def plot(self, variables, output_path=None, **kwargs):
-        """ Plot variables of PTF file against time. Optionally save plot fig
+
+    def plot(self, variables, output_path=None, df=None, **kwargs):
+        """ Plot variables of PTF file against time. Optionally save plot fig.
+        Already extracted DataFrame `df` is plotted instead of reading the
+        file if given.
         """
-        df = self.to_DataFrame(variables)
+        if df is None:
+            df = self.to_DataFrame(variables)
+        else:
+            df = df[variables]
         ax = df.plot(**kwargs)
         fig = ax.get_figure()
         fig.show()
         if output_path:
             out_dir = os.path.dirname(output_path)
-            if not os.path.exists(out_dir):
-                os.makedirs(out_dir)
+            if out_dir:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
             fig.savefig(output_path)
 
 
 def compare_ptf(ptf_lst: list[Ptf], variables: list[str], save_dir=None,
                 plot=True, ret_df=True, **kwargs):
     """ Compare data from PTF files by plotting variables """
-    df_list = [ptf.to_DataFrame(variables) for ptf in ptf_lst]
+    # extraction is I/O bound and every PTF reads its own file, so the
+    # files are read concurrently
+    with ThreadPoolExecutor(max_workers=min(len(ptf_lst), 8) or 1) as ex:
+        df_list = list(ex.map(lambda ptf: ptf.to_DataFrame(variables),
+                              ptf_lst))
     titles = [ptf.title for ptf in ptf_lst]
+    # (title, variable) columns, aligned on time of all the files
+    combined = pd.concat(df_list, axis=1, keys=titles)
+    if save_dir:
+        Path(save_dir).mkdir(parents=True, exist_ok=True)
     for variable in variables:
-        var_list = [df[variable] for df in df_list]
-        var_df = pd.concat(var_list, axis=1)
-        var_df.columns = titles
+        var_df = combined.xs(variable, axis=1, level=1)
         ax = var_df.plot(title=variable, **kwargs)
         fig = ax.get_figure()
         if plot:
             fig.show()
         if save_dir:
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
             fig.savefig(Path(save_dir, f"{variable}.png"))
     if ret_df:
         return pd.concat(df_list)